@@ -1,9 +1,21 @@
 import numpy as np
-import pandas as pd
 import time
 import os
+import atexit
+import mmap
 from dotenv import load_dotenv
 
+# Simplified QRS complex as (offset from beat center, relative amplitude, width) per wave
+QRS_WAVES = (
+    (-0.05, -0.5, 0.02),  # Q wave
+    (0.0, 1.0, 0.03),     # R wave
+    (0.05, -0.3, 0.02),   # S wave
+)
+
+# Ring buffer layout: uint64 head (total samples written), uint64 capacity, uint64 claim
+# (head after the write in progress, so readers can spot overwritten slots), then float32 samples
+RING_HEADER_SIZE = 24
+
 class ECGSimulator:
     def __init__(self):
         """
@@ -18,53 +30,181 @@ class ECGSimulator:
         self.noise_level = float(os.getenv("NOISE_LEVEL", 0.05))
         self.amplitude = float(os.getenv("AMPLITUDE", 1.0))
         self.output_file = os.getenv("OUTPUT_FILE", "../ecg_simulation_data.csv")
+        self.flush_ticks = max(1, int(os.getenv("FLUSH_TICKS", 1)))
+        if self.flush_ticks > 1 and hasattr(os, "writev"):
+            # writev rejects more buffers than IOV_MAX in one call
+            self.flush_ticks = min(self.flush_ticks, os.sysconf("SC_IOV_MAX"))
+        self.ring_buffer_file = os.getenv("RING_BUFFER_FILE", "")
+        self.ring_buffer_samples = int(os.getenv("RING_BUFFER_SAMPLES", 60 * self.sampling_rate))
         
-        # Generate time array
-        self.time = np.linspace(0, self.duration, int(self.duration * self.sampling_rate), endpoint=False)
+        # Generate time array; it is built once and written as-is, so keep it in float64
+        self.time = np.arange(int(self.duration * self.sampling_rate)) / self.sampling_rate
+
+        # The noise-free signal only depends on the parameters above, so build it once
+        self._precompute_templates()
+
+        # Random generator and reusable float32 buffers for the per-tick noise, which halves
+        # the memory traffic of the per-tick signal math
+        self.rng = np.random.default_rng()
+        self.noise_buffer = np.empty(len(self.time), dtype=np.float32)
+        self.signal_buffer = np.empty(len(self.time), dtype=np.float32)
+
+        # Publish raw samples through a shared ring buffer when configured, otherwise append CSV rows
+        self.output_handle = None
+        if self.ring_buffer_file:
+            self._open_ring_buffer()
+        else:
+            # Rows are written as (time, ecg_signal); the time column never changes between ticks
+            self.rows = np.empty((len(self.time), 2))
+            self.rows[:, 0] = self.time
+            self.row_format = "%.6f,%.6f\n" * len(self.time)
+
+            # Each tick is formatted into a single bytes block, so write it straight to one
+            # unbuffered descriptor held for the process lifetime instead of buffering it again
+            self.output_handle = open(self.output_file, 'ab', buffering=0)
+            self.pending_blocks = []  # Formatted ticks waiting for the next writev
+        atexit.register(self.close)
         
-    def _generate_ecg_signal(self):
+    def _open_ring_buffer(self):
         """
-        Generate a realistic ECG signal with P, QRS, and T waves and added noise
+        Map the shared ring buffer file, creating it or replacing it when its size changed
         """
-        beats = self.duration * (self.heart_rate / 60)
-        signal_base = np.zeros_like(self.time)
-        
-        # QRS Complex
-        for i in range(int(beats)):
-            center = i * 60 / self.heart_rate
-            qrs_wave = self._qrs_complex(self.time, center)
-            signal_base += qrs_wave
-        
-        # Add noise
-        noise = np.random.normal(0, self.noise_level, self.time.shape)
-        return signal_base + noise
+        capacity = max(self.ring_buffer_samples, len(self.time))
+        size = RING_HEADER_SIZE + capacity * np.dtype(np.float32).itemsize
+        try:
+            reuse = os.path.getsize(self.ring_buffer_file) == size
+        except FileNotFoundError:
+            reuse = False
+
+        # Never resize a file in place: a reader that still maps the old size would fault,
+        # so lay out a new file next to it and rename it over the old one instead. A <path>.tmp
+        # left behind by a crash before the rename is truncated and reused on the next start.
+        path = self.ring_buffer_file if reuse else self.ring_buffer_file + ".tmp"
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | (0 if reuse else os.O_TRUNC), 0o644)
+        try:
+            if not reuse:
+                os.ftruncate(fd, size)
+            self.ring_map = mmap.mmap(fd, size)
+        except BaseException:
+            if not reuse:
+                os.remove(path)
+            raise
+        finally:
+            os.close(fd)
+        self.ring_header = np.ndarray((3,), dtype=np.uint64, buffer=self.ring_map)
+        self.ring = np.ndarray((capacity,), dtype=np.float32, buffer=self.ring_map, offset=RING_HEADER_SIZE)
+
+        # Keep counting from the previous head when the layout is unchanged so readers just resume
+        if int(self.ring_header[1]) != capacity:
+            self.ring_header[0] = 0
+            self.ring_header[1] = capacity
+        # Drop a claim left behind by a write that never finished
+        self.ring_header[2] = self.ring_header[0]
+        if not reuse:
+            os.replace(path, self.ring_buffer_file)
+
+    def _precompute_templates(self):
+        """
+        Build the deterministic part of the ECG (the QRS complexes) for one duration window
+        """
+        beats = int(self.duration * (self.heart_rate / 60))
+        centers = np.arange(beats) * 60 / self.heart_rate
+        signal_base = np.zeros(len(self.time), dtype=np.float32)
+        n = len(self.time)
+
+        # QRS Complex: scatter-add each wave's template into its +/-5 sigma window for all beats at once
+        for offset, scale, width in QRS_WAVES:
+            template = scale * self.amplitude * self._wave_template(width)
+            half = len(template) // 2
+            starts = np.rint((centers + offset) * self.sampling_rate).astype(int) - half
+            sample_idx = starts[:, None] + np.arange(len(template))[None, :]
+            values = np.broadcast_to(template, sample_idx.shape)
+
+            # Drop the parts of windows that fall outside the time axis
+            inside = (sample_idx >= 0) & (sample_idx < n)
+            np.add.at(signal_base, sample_idx[inside], values[inside])
+        self.signal_template = signal_base
     
-    def _qrs_complex(self, x, center):
+    def _generate_ecg_signal(self):
         """
-        Generate a simplified QRS complex
+        Generate an ECG signal with QRS complexes and added noise.
+        The returned array is reused on the next call.
         """
-        q_wave = self._gaussian_wave(x, center-0.05, amplitude=-0.5 * self.amplitude, width=0.02)
-        r_wave = self._gaussian_wave(x, center, amplitude=self.amplitude, width=0.03)
-        s_wave = self._gaussian_wave(x, center+0.05, amplitude=-0.3 * self.amplitude, width=0.02)
-        return q_wave + r_wave + s_wave
+        # Only the noise changes between iterations, drawn in place without allocating
+        self.rng.standard_normal(dtype=np.float32, out=self.noise_buffer)
+        np.multiply(self.noise_buffer, self.noise_level, out=self.noise_buffer)
+        np.add(self.signal_template, self.noise_buffer, out=self.signal_buffer)
+        return self.signal_buffer
     
-    def _gaussian_wave(self, x, center, amplitude=1.0, width=0.1):
-        return amplitude * np.exp(-((x - center)**2) / (2 * width**2))
+    def _wave_template(self, width):
+        """
+        Sample a unit Gaussian of the given width on a symmetric +/-5 sigma window
+        """
+        half = int(np.ceil(5 * width * self.sampling_rate))
+        offsets = np.arange(-half, half + 1, dtype=np.float32) * np.float32(1.0 / self.sampling_rate)
+        return np.exp(-(offsets**2) / np.float32(2 * width**2))
     
     def write_data(self):
         """
-        Continuously write ECG data to a file
+        Continuously write ECG data to a file or the shared ring buffer
         """
         while True:
-            ecg_signal = self._generate_ecg_signal()
-            df = pd.DataFrame({
-                'time': self.time,
-                'ecg_signal': ecg_signal
-            })
-            df.to_csv(self.output_file, mode='a', header=False, index=False)
+            if self.ring_buffer_file:
+                self._write_ring(self._generate_ecg_signal())
+            else:
+                self.rows[:, 1] = self._generate_ecg_signal()
+                self.pending_blocks.append((self.row_format % tuple(self.rows.ravel().tolist())).encode())
+                if len(self.pending_blocks) >= self.flush_ticks:
+                    self._flush_blocks()
             print(f"Generated and appended {len(self.time)} data points.")
             time.sleep(self.duration)  # Simulate real-time behavior
 
+    def _write_ring(self, samples):
+        """
+        Copy one tick of samples into the ring buffer, then advance the shared head
+        """
+        head = int(self.ring_header[0])
+
+        # Claim the slots first so a reader copying concurrently knows they may be torn
+        self.ring_header[2] = head + len(samples)
+        pos = head % len(self.ring)
+        first = min(len(samples), len(self.ring) - pos)
+        self.ring[pos:pos + first] = samples[:first]
+        self.ring[:len(samples) - first] = samples[first:]
+
+        # Publish the new head only once the samples are in place
+        self.ring_header[0] = head + len(samples)
+
+    def _flush_blocks(self):
+        """
+        Append all pending ticks to the output file in a single writev call
+        """
+        blocks = self.pending_blocks
+        while blocks:
+            if hasattr(os, "writev"):
+                written = os.writev(self.output_handle.fileno(), blocks)
+            else:
+                # os.writev is POSIX-only, so elsewhere write the joined ticks in one call
+                written = self.output_handle.write(b"".join(blocks))
+
+            # After a short write, drop the blocks that made it out and resume mid-block
+            while blocks and written >= len(blocks[0]):
+                written -= len(blocks.pop(0))
+            if blocks:
+                blocks[0] = blocks[0][written:]
+
+    def close(self):
+        """
+        Write any pending ticks and close the output file or ring buffer
+        """
+        if self.output_handle is not None and not self.output_handle.closed:
+            self._flush_blocks()
+            self.output_handle.close()
+        if self.ring_buffer_file and not self.ring_map.closed:
+            # Release the array views before unmapping
+            self.ring_header = self.ring = None
+            self.ring_map.close()
+
 if __name__ == '__main__':
     generator = ECGSimulator()
     generator.write_data()
\ No newline at end of file
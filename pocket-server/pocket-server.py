@@ -1,11 +1,19 @@
-import pandas as pd
+import mmap
+import numpy as np
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
 import time
 from threading import Thread, Event
+from queue import Queue
 from datetime import datetime
 import os
 from dotenv import load_dotenv
 
+# Ring buffer layout shared with the generator: uint64 head, uint64 capacity,
+# uint64 claim (head after the write in progress), then float32 samples
+RING_HEADER_SIZE = 24
+
 class ECGDataReceiver:
     def __init__(self):
         """
@@ -16,18 +24,39 @@ class ECGDataReceiver:
 
         self.user_id = os.getenv('USER_ID', '67FD20')
         self.csv_file_path = os.getenv('CSV_FILE_PATH', '../ecg_simulation_data.csv')
+        self.ring_buffer_file = os.getenv('RING_BUFFER_FILE', '')
         self.api_endpoint = os.getenv('API_ENDPOINT', 'http://localhost:8000/api/ecg-data')
         self.batch_size = int(os.getenv('BATCH_SIZE', 250))
+        self.sampling_rate = int(os.getenv('SAMPLING_RATE', 250))  # Must match the generator
         self.send_interval = int(os.getenv('SEND_INTERVAL', 1))
+        # More than one sender overlaps requests but no longer delivers batches in order
+        self.send_workers = int(os.getenv('SEND_WORKERS', 1))
+        if self.send_workers < 1:
+            raise ValueError(f"SEND_WORKERS must be at least 1, got {self.send_workers}")
         self.stop_event = Event()
-        self.last_sent_row = 0  # To track the last row processed
+
+        # Batches waiting to be posted by the sender threads
+        self.send_queue = Queue(maxsize=16)
+
+        # Reuse one keep-alive connection per sender thread for every POST to the API
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.send_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['Content-Type'] = 'application/json'
+
+        self.csv_handle = None
+        self.last_file_pos = 0  # Byte offset just past the last line processed
+        self.ring_map = None
+        self.ring_tail = 0  # Total samples read from the ring buffer
 
     def send_data_to_api(self, data_batch):
         """
         Send a batch of data to the backend API
         """
         try:
-            response = requests.post(self.api_endpoint, json={'user_id': self.user_id, 'data': data_batch})
+            body = orjson.dumps({'user_id': self.user_id, 'data': data_batch})
+            response = self.session.post(self.api_endpoint, data=body)
             if response.status_code in [200, 201]:
                 print(f"Sent {len(data_batch)} data points successfully.")
             else:
@@ -35,34 +64,131 @@ class ECGDataReceiver:
         except requests.RequestException as e:
             print(f"API Request Error: {e}")
     
+    def _send_worker(self):
+        """
+        Post queued batches to the backend API until a None sentinel is received
+        """
+        while True:
+            batch = self.send_queue.get()
+            if batch is None:
+                break
+            try:
+                self.send_data_to_api(batch)
+            except Exception as e:
+                # Keep the sender alive so the queue never stops draining
+                print(f"Error: {e}")
+
+    def _read_csv_samples(self):
+        """
+        Read the ECG samples from the complete lines appended to the CSV file since the last read
+        """
+        if self.csv_handle is None:
+            self.csv_handle = open(self.csv_file_path, 'rb')
+        self.csv_handle.seek(self.last_file_pos)
+        chunk = self.csv_handle.read()
+
+        # Leave a partially written last line for the next read
+        end = chunk.rfind(b'\n') + 1
+        self.last_file_pos += end
+        if not end:
+            return []
+
+        # Parse the signal column of every new line in one pass of numpy's C reader
+        return np.loadtxt(chunk[:end].decode().splitlines(), delimiter=',', usecols=1, ndmin=1).tolist()
+
+    def _map_ring(self):
+        """
+        Map the shared ring buffer file read-only, returning False if it is not laid out yet
+        """
+        with open(self.ring_buffer_file, 'rb') as f:
+            self.ring_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.ring_inode = os.fstat(f.fileno()).st_ino
+        self.ring_header = np.ndarray((3,), dtype=np.uint64, buffer=self.ring_map)
+        capacity = int(self.ring_header[1])
+        if capacity == 0 or RING_HEADER_SIZE + capacity * np.dtype(np.float32).itemsize > len(self.ring_map):
+            self._unmap_ring()
+            return False
+        self.ring = np.ndarray((capacity,), dtype=np.float32, buffer=self.ring_map, offset=RING_HEADER_SIZE)
+
+        # Start from the oldest sample still held in the ring
+        self.ring_tail = max(int(self.ring_header[0]) - capacity, 0)
+        return True
+
+    def _unmap_ring(self):
+        """
+        Release the array views and unmap the ring buffer file
+        """
+        self.ring_header = self.ring = None
+        self.ring_map.close()
+        self.ring_map = None
+
+    def _read_ring_samples(self):
+        """
+        Read the ECG samples published to the shared ring buffer since the last read
+        """
+        # A generator restarted with a new capacity swaps in a new file, so follow it
+        if self.ring_map is not None and (
+            os.stat(self.ring_buffer_file).st_ino != self.ring_inode
+            or int(self.ring_header[1]) != len(self.ring)
+        ):
+            self._unmap_ring()
+        if self.ring_map is None and not self._map_ring():
+            return []
+
+        head = int(self.ring_header[0])
+        capacity = len(self.ring)
+        if head < self.ring_tail:
+            # The generator restarted with a fresh ring
+            self.ring_tail = 0
+        if head - self.ring_tail > capacity:
+            print(f"Ring buffer overrun, skipped {head - capacity - self.ring_tail} data points.")
+            self.ring_tail = head - capacity
+
+        samples = self.ring.take(np.arange(self.ring_tail, head), mode='wrap')
+
+        # Seqlock-style check: slots below the writer's claim minus capacity may have been
+        # overwritten while they were copied, so drop them rather than send torn samples
+        oldest = int(self.ring_header[2]) - capacity
+        if oldest > self.ring_tail:
+            skipped = min(oldest - self.ring_tail, len(samples))
+            print(f"Ring buffer overrun during read, skipped {skipped} data points.")
+            samples = samples[skipped:]
+        self.ring_tail = head
+
+        # Round to the precision the CSV path carries instead of sending float32 artifacts
+        return np.round(samples.astype(np.float64), 6).tolist()
+
     def process_data(self):
         """
-        Continuously read CSV data and send it to the backend at intervals
+        Continuously read ECG data and queue it in batches for the sender threads
         """
+        source = self.ring_buffer_file or self.csv_file_path
         while not self.stop_event.is_set():
             try:
-                # Read only new data since the last sent row
-                data = pd.read_csv(self.csv_file_path, names=['time', 'ecg_signal'], header=None, skiprows=self.last_sent_row)
-                if not data.empty:
-                    # Add a unique timestamp for each row
-                    data['timestamp'] = [datetime.now().isoformat() for _ in range(len(data))]
-                    
-                    # Remove 'time' field
-                    data.drop(columns=['time'], inplace=True)
-
-                    # Process in batches
-                    for i in range(0, len(data), self.batch_size):
-                        batch = data.iloc[i:i+self.batch_size].to_dict(orient='records')
-                        self.send_data_to_api(batch)
+                # Read only the samples produced since the last read
+                if self.ring_buffer_file:
+                    samples = self._read_ring_samples()
+                else:
+                    samples = self._read_csv_samples()
+                if samples:
+                    # Stamp the newest sample with the time of this read and space the older
+                    # ones one sampling period apart, so every sample keeps a distinct, ordered time
+                    read_time = np.datetime64(datetime.now(), 'us')
+                    offsets = np.arange(len(samples) - 1, -1, -1) * (1e6 / self.sampling_rate)
+                    timestamps = np.datetime_as_string(read_time - offsets.astype('timedelta64[us]'), unit='us').tolist()
+                    data = [
+                        {'ecg_signal': value, 'timestamp': timestamp}
+                        for value, timestamp in zip(samples, timestamps)
+                    ]
 
-                        # Pause for the specified interval between sending batches
-                        if not self.stop_event.is_set():
-                            time.sleep(self.send_interval)
-
-                    # Update the last row sent
-                    self.last_sent_row += len(data)
+                    # Hand off in batches so parsing never waits on the network
+                    for i in range(0, len(data), self.batch_size):
+                        self.send_queue.put(data[i:i+self.batch_size])
+                else:
+                    # Poll for new data at the configured interval
+                    time.sleep(self.send_interval)
             except FileNotFoundError:
-                print(f"CSV file {self.csv_file_path} not found. Retrying...")
+                print(f"Data file {source} not found. Retrying...")
                 time.sleep(self.send_interval)
             except Exception as e:
                 print(f"Error: {e}")
@@ -70,17 +196,29 @@ class ECGDataReceiver:
 
     def start(self):
         """
-        Start the processing thread
+        Start the sender threads and the processing thread
         """
+        self.workers = [Thread(target=self._send_worker) for _ in range(self.send_workers)]
+        for worker in self.workers:
+            worker.start()
         self.thread = Thread(target=self.process_data)
         self.thread.start()
 
     def stop(self):
         """
-        Stop the processing thread
+        Stop the processing thread, then let the sender threads drain the queue
         """
         self.stop_event.set()
         self.thread.join()
+        for _ in self.workers:
+            self.send_queue.put(None)
+        for worker in self.workers:
+            worker.join()
+        if self.csv_handle is not None:
+            self.csv_handle.close()
+        if self.ring_map is not None:
+            self._unmap_ring()
+        self.session.close()
         print("ECG Data Receiver stopped.")
 
 if __name__ == '__main__':